@@ -0,0 +1,328 @@
+"""
+HTTP benchmark for every route in ``hotels.py``.
+
+Drives each scenario at a fixed concurrency against a running server and reports
+throughput and p50/p95/p99 latency. Results are saved as JSON tagged with the git
+commit so runs can be compared:
+
+    CHUBBY_DATABASE_URL=sqlite:///./bench.db uvicorn hotels:app --workers 4
+    python benchmark.py --url http://127.0.0.1:8000 --out bench-before.json
+    # ...change code, restart server...
+    python benchmark.py --url http://127.0.0.1:8000 --out bench-after.json --compare bench-before.json
+
+Use a DB seeded by ``loadSynthetic.py`` so every run sees the same data. Write
+scenarios add rows, so reseed (or restore a copy of the DB) between comparisons.
+
+``--startup N`` instead measures worker boot N times: the cost of importing ``hotels``
+and building its app, and the time from launching a server process to its first successful response.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+# A 1x1 PNG, enough to exercise the upload path.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: Optional[bytes] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+def _multipart(fields: List[Tuple[str, str]], files: List[Tuple[str, str, bytes]]) -> Tuple[bytes, Dict[str, str]]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: image/png\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def scenarios(max_hotel_id: int, max_user_id: int, max_review_id: int) -> Dict[str, Callable[[random.Random], Request]]:
+    def hotel_id(rng):
+        return rng.randint(1, max_hotel_id)
+
+    def post_hotel(rng):
+        body, headers = _multipart(
+            [
+                ("name", "Bench Hotel"),
+                ("description", "Benchmark hotel"),
+                ("location", "France"),
+                ("email", f"bench{rng.randint(1, 1000)}@example.com"),
+            ],
+            [("images", "bench.png", PNG)],
+        )
+        return Request("POST", "/hotels", body, headers)
+
+    def post_review(rng):
+        body, headers = _multipart(
+            [
+                ("hotel_id", str(hotel_id(rng))),
+                ("email", f"bench{rng.randint(1, 1000)}@example.com"),
+                ("overall_review", "Benchmark review"),
+                ("image_types", "room"),
+            ],
+            [("images", "bench.png", PNG)],
+        )
+        return Request("POST", "/reviews", body, headers)
+
+    def post_review_json(rng):
+        body = json.dumps({
+            "hotel_id": hotel_id(rng),
+            "email": f"bench{rng.randint(1, 1000)}@example.com",
+            "overall_review": "Benchmark review",
+        }).encode()
+        return Request("POST", "/reviews/json", body, {"Content-Type": "application/json"})
+
+    return {
+        "GET /hotels": lambda rng: Request("GET", "/hotels"),
+        "GET /hotels?hotel_id": lambda rng: Request("GET", f"/hotels?{urlencode({'hotel_id': hotel_id(rng)})}"),
+        "GET /hotels?location": lambda rng: Request(
+            "GET", f"/hotels?{urlencode({'location': rng.choice(['France', 'Japan', 'Peru', 'Kenya'])})}"
+        ),
+        "POST /hotels": post_hotel,
+        "GET /reviews": lambda rng: Request("GET", "/reviews"),
+        "GET /reviews?review_id": lambda rng: Request("GET", f"/reviews?review_id={rng.randint(1, max_review_id)}"),
+        "GET /reviews?hotel_id": lambda rng: Request("GET", f"/reviews?hotel_id={hotel_id(rng)}"),
+        "GET /reviews?user_id": lambda rng: Request("GET", f"/reviews?user_id={rng.randint(1, max_user_id)}"),
+        "GET /reviews/hotel/{hotel_id}": lambda rng: Request("GET", f"/reviews/hotel/{hotel_id(rng)}"),
+        "POST /reviews": post_review,
+        "POST /reviews/json": post_review_json,
+        "GET /locations": lambda rng: Request("GET", "/locations"),
+    }
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(
+    url: str,
+    make_request: Callable[[random.Random], Request],
+    concurrency: int,
+    requests: int,
+    duration: float,
+    seed: int,
+) -> dict:
+    target = urlsplit(url)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def take() -> bool:
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(worker_id: int, deadline: float):
+        rng = random.Random(f"{seed}-{worker_id}")
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        while time.perf_counter() < deadline and take():
+            req = make_request(rng)
+            started = time.perf_counter()
+            try:
+                conn.request(req.method, req.path, body=req.body, headers=req.headers or {})
+                response = conn.getresponse()
+                response.read()
+                outcome = None if response.status < 400 or response.status == 404 else str(response.status)
+            except (OSError, http.client.HTTPException) as e:
+                outcome = type(e).__name__
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if outcome:
+                    errors[outcome] = errors.get(outcome, 0) + 1
+        conn.close()
+
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [threading.Thread(target=worker, args=(i, deadline)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _summary(samples: List[float], errors: Dict[str, int]) -> dict:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": 0.0,
+        "p50_ms": round(_percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(_percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+    }
+
+
+def measure_startup(runs: int, server_cmd: str, port: int, timeout: float = 60.0) -> Dict[str, dict]:
+    """Time importing ``hotels`` plus building its app, and server launch to first ``GET /locations`` 200, ``runs`` times each."""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    import_code = "import time; t = time.perf_counter(); import hotels; hotels.app; print(time.perf_counter() - t)"
+    imports: List[float] = []
+    ready: List[float] = []
+    errors: Dict[str, int] = {}
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", import_code], cwd=app_dir, capture_output=True, text=True)
+        if out.returncode == 0:
+            imports.append(float(out.stdout.strip().splitlines()[-1]))
+        else:
+            errors["import"] = errors.get("import", 0) + 1
+
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            server_cmd.format(python=sys.executable, port=port).split(),
+            cwd=app_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - started < timeout and proc.poll() is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                try:
+                    conn.request("GET", "/locations")
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status == 200:
+                        ready.append(time.perf_counter() - started)
+                        break
+                except (OSError, http.client.HTTPException):
+                    pass
+                finally:
+                    conn.close()
+                # Back off on every failed probe, including non-200 responses (e.g. an
+                # unmigrated DB), so polling does not load the worker being timed.
+                time.sleep(0.01)
+            else:
+                errors["ready"] = errors.get("ready", 0) + 1
+        finally:
+            proc.terminate()
+            proc.wait()
+    return {
+        "startup: import + build app": _summary(imports, {k: v for k, v in errors.items() if k == "import"}),
+        "startup: first response": _summary(ready, {k: v for k, v in errors.items() if k == "ready"}),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: Optional[dict] = None) -> None:
+    header = f"{'scenario':34} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["scenarios"].items():
+        line = (
+            f"{name:34} {r['throughput_rps']:9.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} "
+            f"{r['p99_ms']:9.2f} {sum(r['errors'].values()):7d}"
+        )
+        print(line)
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        if base:
+            deltas = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+                if base[key]:
+                    deltas.append(f"{(r[key] - base[key]) / base[key] * 100:+8.1f}%")
+                else:
+                    deltas.append(f"{'n/a':>9}")
+            print(f"{'  vs ' + str(baseline.get('commit')):34} " + " ".join(deltas))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--duration", type=float, default=30.0, help="Max seconds per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    parser.add_argument("--max-hotel-id", type=int, default=1000)
+    parser.add_argument("--max-user-id", type=int, default=1000)
+    parser.add_argument("--max-review-id", type=int, default=10000)
+    parser.add_argument("--only", action="append", help="Run only scenarios containing this text (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup", type=int, metavar="N", help="Measure worker startup N times instead of routes")
+    parser.add_argument(
+        "--server-cmd", default="{python} -m uvicorn --factory hotels:create_app --port {port}",
+        help="Command used by --startup to launch a worker",
+    )
+    parser.add_argument("--port", type=int, default=8765, help="Port used by --startup")
+    parser.add_argument("--out", help="Write JSON results here")
+    parser.add_argument("--compare", help="Baseline JSON from a previous run")
+    args = parser.parse_args(argv)
+
+    results = {
+        "commit": _git_commit(),
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "scenarios": {},
+    }
+    if args.startup:
+        results["scenarios"] = measure_startup(args.startup, args.server_cmd, args.port)
+    for name, make_request in scenarios(args.max_hotel_id, args.max_user_id, args.max_review_id).items():
+        if args.startup or args.only and not any(o in name for o in args.only):
+            continue
+        if args.warmup:
+            run_scenario(args.url, make_request, args.concurrency, args.warmup, args.duration, args.seed + 1)
+        results["scenarios"][name] = run_scenario(
+            args.url, make_request, args.concurrency, args.requests, args.duration, args.seed
+        )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
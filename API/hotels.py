@@ -1,27 +1,28 @@
+import logging
+import os
+import shutil
+import sqlite3
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Query, Form, File, UploadFile
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Form, File, UploadFile
 from typing import List, Optional, Dict
 from sqlalchemy.orm import Session, joinedload
 
-from models import Base, engine, SessionLocal, HotelClassEnum, HotelDB, HotelImageDB, Hotel, ReviewDB, ReviewImageDB, ReviewImageTypeEnum, ReviewResponse, ReviewCreate, UserDB
+from models import engine, init_db, SessionLocal, HotelClassEnum, HotelDB, HotelImageDB, Hotel, ReviewDB, ReviewImageDB, ReviewImageTypeEnum, ReviewResponse, ReviewCreate, UserDB
 from fastapi.middleware.cors import CORSMiddleware
 from collections import defaultdict
 from fastapi.staticfiles import StaticFiles
-# ---------- Create tables ----------
-Base.metadata.create_all(bind=engine)
+from fastapi.concurrency import run_in_threadpool
+from jobs import WorkerPool, queue as job_queue
+from metrics import MetricsMiddleware, instrument_engine, instrument_serialization, instrument_threadpool, router as metrics_router
 
+AUTO_MIGRATE = os.getenv("CHUBBY_AUTO_MIGRATE", "").lower() in ("1", "true", "yes")
+UPLOADS_DIR = Path("uploads")
 
-# ---------- FastAPI App ----------
-app = FastAPI()
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],      # allow all domains
-    allow_credentials=True,   # allow cookies and auth headers
-    allow_methods=["*"],      # allow all HTTP methods
-    allow_headers=["*"],      # allow all headers
-)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
 
 
 def _get_or_create_user_by_email(
@@ -44,9 +45,29 @@ def _get_or_create_user_by_email(
     return user
 
 
+def _save_upload(upload: UploadFile, path: str) -> None:
+    """Stream an upload to disk in chunks (run in the threadpool, off the event loop)."""
+    upload.file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, 1024 * 1024)
+
+
+def _enqueue_image_jobs(kind: str, image_ids: List[int]) -> None:
+    """
+    Best effort: the rows are already committed, so a queue failure must not turn into a 500
+    (a client retry would create a duplicate). Missed hotel images are picked up by
+    ``python s3mirror.py``, which backfills every row still lacking ``s3_url``.
+    """
+    try:
+        for image_id in image_ids:
+            job_queue.enqueue(kind, {"image_id": image_id}, idempotency_key=f"{kind}:{image_id}")
+    except sqlite3.Error:
+        logger.exception("Could not enqueue %s jobs for images %s", kind, image_ids)
+
+
 # ---------- Routes ----------
 
-@app.get("/hotels", response_model=List[Hotel])
+@router.get("/hotels", response_model=List[Hotel])
 def get_hotels(
     hotel_id: Optional[int] = None,
     location: Optional[str] = Query(None, description="City or country name")
@@ -69,7 +90,7 @@ def get_hotels(
         return hotels
 
 
-@app.post("/hotels", response_model=Hotel)
+@router.post("/hotels", response_model=Hotel)
 async def create_hotel(
     name: str = Form(...),
     description: str = Form(...),
@@ -108,13 +129,17 @@ async def create_hotel(
         session.commit()
         session.refresh(hotel_row)
 
+        image_rows = []
         for i, image in enumerate(image_list):
-            raw = await image.read()
             rel_path = f"uploads/hotels/{hotel_row.id}_{i}_{image.filename}"
-            Path(rel_path).write_bytes(raw)
-            session.add(HotelImageDB(hotel_id=hotel_row.id, image_url=rel_path))
-        if image_list:
+            await run_in_threadpool(_save_upload, image, rel_path)
+            image_rows.append(HotelImageDB(hotel_id=hotel_row.id, image_url=rel_path))
+        if image_rows:
+            session.add_all(image_rows)
+            session.flush()
+            image_ids = [img.id for img in image_rows]
             session.commit()
+            await run_in_threadpool(_enqueue_image_jobs, "hotel_image.uploaded", image_ids)
 
         out = (
             session.query(HotelDB)
@@ -127,7 +152,7 @@ async def create_hotel(
         return out
 
 
-@app.get("/reviews", response_model=List[ReviewResponse])
+@router.get("/reviews", response_model=List[ReviewResponse])
 def get_reviews(
     review_id: Optional[int] = None,
     hotel_id: Optional[int] = None,
@@ -158,7 +183,7 @@ def get_reviews(
         reviews = query.all()
         return reviews
 
-@app.get("/reviews/hotel/{hotel_id}", response_model=List[ReviewResponse])
+@router.get("/reviews/hotel/{hotel_id}", response_model=List[ReviewResponse])
 def get_reviews_by_hotel(hotel_id: int):
     """
     Get all reviews for a specific hotel
@@ -177,7 +202,7 @@ def get_reviews_by_hotel(hotel_id: int):
 
         return reviews
 
-@app.post("/reviews", response_model=ReviewResponse)
+@router.post("/reviews", response_model=ReviewResponse)
 async def create_review(
     hotel_id: int = Form(...),
     email: str = Form(...),
@@ -225,10 +250,8 @@ async def create_review(
         if image_list:
             for i, image in enumerate(image_list):
                 if image.filename:
-                    image_data = await image.read()
                     image_path = f"uploads/reviews/{db_review.id}_{i}_{image.filename}"
-                    with open(image_path, "wb") as f:
-                        f.write(image_data)
+                    await run_in_threadpool(_save_upload, image, image_path)
 
                     image_type = ReviewImageTypeEnum.overall
                     if i < len(type_list) and type_list[i] in ReviewImageTypeEnum:
@@ -253,7 +276,7 @@ async def create_review(
         return db_review_with_relations
 
 
-@app.post("/reviews/json", response_model=ReviewResponse)
+@router.post("/reviews/json", response_model=ReviewResponse)
 def create_review_json(body: ReviewCreate):
     """
     JSON body (no images). In Swagger, JSON requests use **one** editor for the
@@ -295,7 +318,7 @@ def create_review_json(body: ReviewCreate):
 
 # ---------- User Endpoints ----------
 
-@app.get("/locations", response_model=Dict[str, List[str]])
+@router.get("/locations", response_model=Dict[str, List[str]])
 def get_locations():
     """
     Distinct locations from hotels: continent name → sorted list of countries.
@@ -322,4 +345,55 @@ def get_locations():
     return {
         cont: sorted(by_continent[cont], key=str.casefold)
         for cont in sorted(by_continent.keys(), key=str.casefold)
-    }
\ No newline at end of file
+    }
+
+
+# ---------- FastAPI App ----------
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation is a deploy step (``python migrate.py``), not something every worker pays for.
+    if app.state.auto_migrate:
+        init_db()
+    for sub in ("hotels", "reviews"):
+        (UPLOADS_DIR / sub).mkdir(parents=True, exist_ok=True)
+    workers = WorkerPool(job_queue)
+    workers.start()
+    yield
+    workers.stop()
+
+
+def create_app(auto_migrate: bool = AUTO_MIGRATE) -> FastAPI:
+    """
+    Build the API. ``uvicorn --factory hotels:create_app`` calls this directly;
+    ``uvicorn hotels:app`` gets a module-level instance built on first access.
+    Set ``CHUBBY_AUTO_MIGRATE=1`` (or pass ``auto_migrate=True``) to create tables on startup.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.state.auto_migrate = auto_migrate
+    # check_dir=False: the directory is created in ``lifespan`` instead of crashing at import.
+    app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR), check_dir=False), name="uploads")
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],      # allow all domains
+        allow_credentials=True,   # allow cookies and auth headers
+        allow_methods=["*"],      # allow all HTTP methods
+        allow_headers=["*"],      # allow all headers
+    )
+    # Outermost, so latency includes CORS handling.
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_serialization()
+    instrument_threadpool()
+    app.include_router(metrics_router)
+    app.include_router(router)
+    return app
+
+
+def __getattr__(name: str):
+    # Built lazily, so importing this module (e.g. for ``--factory``) builds no app and
+    # installs no instrumentation.
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,248 @@
+"""
+Persistent local job queue for post-write work (SQLite-backed, separate from chubby.db).
+
+Routes call ``enqueue`` after their own commit and return; a ``WorkerPool`` runs the
+registered handler for each job with retries and exponential backoff. Jobs are
+deduplicated by ``idempotency_key``, so handlers must be safe to run more than once.
+
+Environment:
+
+- ``CHUBBY_JOBS_DB``: queue file (default ``./jobs.db``).
+- ``CHUBBY_JOB_WORKERS``: worker threads started with the app (default 2; ``0`` to run
+  workers elsewhere with ``python jobs.py``).
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from metrics import Gauge, register as register_metric
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.getenv("CHUBBY_JOBS_DB", "./jobs.db")
+JOB_WORKERS = int(os.getenv("CHUBBY_JOB_WORKERS", "2"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    locked_at REAL,
+    locked_by TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+"""
+
+HANDLERS: Dict[str, Callable[[dict], None]] = {}
+
+
+def job(kind: str):
+    """Register ``fn(payload)`` as the handler for jobs of ``kind``."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_DB, visibility_timeout: float = 300.0, retry_backoff: float = 2.0):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.retry_backoff = retry_backoff
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Connections (and the schema) are created on first use, so importing this module
+        # does not touch the disk.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: dict, idempotency_key: Optional[str] = None, max_attempts: int = 5) -> int:
+        """Add a job and return its id; an existing job with the same key is returned instead."""
+        now = time.time()
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, payload, idempotency_key, max_attempts, run_at, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+            (kind, json.dumps(payload), idempotency_key, max_attempts, now, now),
+        )
+        self._wake.set()
+        if cur.rowcount:
+            return cur.lastrowid
+        return conn.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()[0]
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Lock the next due job (or one whose worker died) for ``worker``."""
+        now = time.time()
+        row = self._conn().execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_at = ?, locked_by = ?"
+            " WHERE id = (SELECT id FROM jobs"
+            "   WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_at < ?)"
+            "   ORDER BY run_at LIMIT 1)"
+            " RETURNING id, kind, payload, attempts, max_attempts",
+            (now, worker, now, now - self.visibility_timeout),
+        ).fetchone()
+        if row is None:
+            return None
+        return Job(id=row[0], kind=row[1], payload=json.loads(row[2]), attempts=row[3], max_attempts=row[4])
+
+    def complete(self, job_id: int) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', locked_at = NULL, last_error = NULL WHERE id = ?", (job_id,)
+        )
+
+    def fail(self, job: Job, error: str) -> None:
+        if job.attempts >= job.max_attempts:
+            self._conn().execute(
+                "UPDATE jobs SET status = 'failed', locked_at = NULL, last_error = ? WHERE id = ?", (error, job.id)
+            )
+            return
+        run_at = time.time() + self.retry_backoff * 2 ** (job.attempts - 1)
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', locked_at = NULL, run_at = ?, last_error = ? WHERE id = ?",
+            (run_at, error, job.id),
+        )
+
+    def depth(self) -> Dict[tuple, int]:
+        rows = self._conn().execute(
+            "SELECT kind, status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running', 'failed')"
+            " GROUP BY kind, status"
+        ).fetchall()
+        return {(("kind", kind), ("status", status)): count for kind, status, count in rows}
+
+    def lag(self) -> Dict[tuple, float]:
+        """Seconds the oldest due job of each kind has been waiting."""
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT kind, MIN(run_at) FROM jobs WHERE status = 'queued' AND run_at <= ? GROUP BY kind", (now,)
+        ).fetchall()
+        return {(("kind", kind),): round(now - oldest, 3) for kind, oldest in rows}
+
+    def wait(self, timeout: float) -> None:
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+
+class WorkerPool:
+    def __init__(self, queue: JobQueue, workers: int = JOB_WORKERS, poll_interval: float = 1.0):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            name = f"{socket.gethostname()}:{os.getpid()}:job-worker-{i}"
+            t = threading.Thread(target=self._run, args=(name,), name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self.queue._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def run_once(self, worker: str = "inline") -> bool:
+        """Run one due job; returns False when there was nothing to do."""
+        claimed = self.queue.claim(worker)
+        if claimed is None:
+            return False
+        handler = HANDLERS.get(claimed.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {claimed.kind!r}")
+            handler(claimed.payload)
+        except Exception as e:
+            logger.exception("Job %s (%s) attempt %s failed", claimed.id, claimed.kind, claimed.attempts)
+            self.queue.fail(claimed, f"{type(e).__name__}: {e}")
+        else:
+            self.queue.complete(claimed.id)
+        return True
+
+    def _run(self, name: str) -> None:
+        while not self._stop.is_set():
+            try:
+                if not self.run_once(name):
+                    self.queue.wait(self.poll_interval)
+            except sqlite3.OperationalError:
+                logger.exception("Job queue unavailable; retrying")
+                self._stop.wait(self.poll_interval)
+
+
+queue = JobQueue()
+
+register_metric(Gauge("chubby_job_queue_depth", "Jobs by kind and status.", queue.depth))
+register_metric(Gauge("chubby_job_queue_lag_seconds", "Age of the oldest due job, by kind.", queue.lag))
+
+
+# ---------- Handlers ----------
+
+def _check_upload(model, image_id: int):
+    """Return the image row, or None if it was deleted; raise (and retry) if its file is missing."""
+    from models import SessionLocal
+
+    with SessionLocal() as session:
+        image = session.get(model, image_id)
+        if image is None:
+            return None
+        if not os.path.exists(image.image_url):
+            raise FileNotFoundError(image.image_url)
+        session.expunge(image)
+        return image
+
+
+@job("hotel_image.uploaded")
+def process_hotel_image(payload: dict) -> None:
+    from models import HotelImageDB
+    import s3mirror
+
+    if _check_upload(HotelImageDB, payload["image_id"]) is not None and s3mirror.enabled():
+        s3mirror.get_mirror().mirror(payload["image_id"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    pool = WorkerPool(queue, workers=max(JOB_WORKERS, 1))
+    pool.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
@@ -1,10 +1,7 @@
 import requests
-from models import Base, engine, SessionLocal, HotelClassEnum, HotelDB, HotelImageDB, UserDB, ReviewDB
+from models import init_db, SessionLocal, HotelClassEnum, HotelDB, HotelImageDB, UserDB, ReviewDB
 from sqlalchemy.exc import IntegrityError
 
-# --- Create tables ---
-Base.metadata.create_all(bind=engine)
-
 
 def fetch_hotels_paginated(search_term: str, max_hotels=3000):
     url = "https://serpapi.com/search"
@@ -139,7 +136,7 @@ def save_hotels_to_db(properties):
             session.close()
 
 def reverse_geocode(lat, lng):
-    api_key = " 
+    api_key = ""
     url = f"https://api.opencagedata.com/geocode/v1/json?q={lat}+{lng}&key={api_key}"
     try:
         response = requests.get(url, timeout=10)
@@ -188,6 +185,7 @@ def clean_broken_images():
     print(f"Removed {removed_count} broken images.")
 
 if __name__ == "__main__":
+    init_db()
     choice = input("Enter 'fetch' to fetch and save hotels, or 'clean' to remove broken images: ").strip().lower()
 
     if choice == "fetch":
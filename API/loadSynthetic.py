@@ -0,0 +1,203 @@
+"""
+Deterministic synthetic data for benchmarks (no SerpAPI / OpenCage keys needed).
+
+Fills hotels, hotel_images, users, reviews and review_images at a configurable scale.
+The same ``--seed`` and counts always produce the same rows, so benchmark runs on
+different commits see identical data.
+
+    python loadSynthetic.py --database-url sqlite:///./bench.db --hotels 100000 --reviews 10000000
+    CHUBBY_DATABASE_URL=sqlite:///./bench.db uvicorn hotels:app
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+CONTINENTS = {
+    "Europe": ["France", "Germany", "Italy", "Spain", "Portugal", "Greece", "Switzerland"],
+    "Asia": ["Japan", "Thailand", "Indonesia", "Vietnam", "India", "Maldives"],
+    "North America": ["United States", "Canada", "Mexico"],
+    "Oceania": ["Australia", "New Zealand", "Fiji"],
+    "Africa": ["Morocco", "South Africa", "Kenya", "Tanzania"],
+    "South America": ["Brazil", "Argentina", "Chile", "Peru"],
+}
+COUNTRIES = [(continent, country) for continent, countries in CONTINENTS.items() for country in countries]
+WORDS = (
+    "grand palace resort villa suites bay ocean garden royal lodge retreat spa harbour "
+    "view quiet lovely spacious breakfast staff pool beach rooftop terrace sunset modern"
+).split()
+
+
+def _text(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def _next_id(conn, table) -> int:
+    from sqlalchemy import func, select
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _insert_batches(conn, table, rows, batch_size: int, label: str, total: int) -> None:
+    batch = []
+    done = 0
+    started = time.perf_counter()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            done += len(batch)
+            batch = []
+            print(f"\r{label}: {done}/{total} ({done / (time.perf_counter() - started):.0f} rows/s)", end="")
+    if batch:
+        conn.execute(table.insert(), batch)
+        done += len(batch)
+    print(f"\r{label}: {done}/{total} in {time.perf_counter() - started:.1f}s" + " " * 20)
+
+
+def generate(
+    hotels: int,
+    images_per_hotel: int,
+    users: int,
+    reviews: int,
+    review_image_ratio: float,
+    seed: int,
+    batch_size: int,
+) -> None:
+    from models import engine, init_db, HotelClassEnum, HotelDB, HotelImageDB, UserDB, ReviewDB, ReviewImageDB, ReviewImageTypeEnum
+
+    init_db()
+    hotel_t = HotelDB.__table__
+    hotel_image_t = HotelImageDB.__table__
+    user_t = UserDB.__table__
+    review_t = ReviewDB.__table__
+    review_image_t = ReviewImageDB.__table__
+    image_types = list(ReviewImageTypeEnum)
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            conn.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+
+        first_hotel = _next_id(conn, hotel_t)
+        first_user = _next_id(conn, user_t)
+        first_review = _next_id(conn, review_t)
+        first_hotel_image = _next_id(conn, hotel_image_t)
+        first_review_image = _next_id(conn, review_image_t)
+
+        def hotel_rows():
+            rng = random.Random(f"{seed}-hotels")
+            for i in range(hotels):
+                hotel_id = first_hotel + i
+                continent, country = rng.choice(COUNTRIES)
+                rate = rng.randint(500, 5000)
+                yield {
+                    "id": hotel_id,
+                    "name": f"{_text(rng, 2)[:-1]} {hotel_id}",
+                    "description": _text(rng, 20),
+                    "location": country,
+                    "address": f"https://example.com/hotels/{hotel_id}",
+                    "country": country,
+                    "city": f"City {rng.randint(1, 200)}",
+                    "state": None,
+                    "province": None,
+                    "zip": f"{rng.randint(10000, 99999)}",
+                    "continent": continent,
+                    "hotelClass": HotelClassEnum.chubby if rate < 2000 else HotelClassEnum.fat,
+                    "property_token": f"synthetic-{seed}-{hotel_id}",
+                    "rate": rate,
+                    "overall_rating": round(rng.uniform(3.5, 5.0), 1),
+                    "location_rating": round(rng.uniform(3.5, 5.0), 1),
+                    "HotelType": "hotel",
+                    "link": f"https://example.com/hotels/{hotel_id}",
+                    "is_active": True,
+                    "owner_id": None,
+                }
+
+        def hotel_image_rows():
+            for i in range(hotels * images_per_hotel):
+                hotel_id = first_hotel + i // images_per_hotel
+                key = f"synthetic/hotels/{hotel_id}_{i % images_per_hotel}.jpg"
+                yield {
+                    "id": first_hotel_image + i,
+                    "hotel_id": hotel_id,
+                    "image_url": f"uploads/{key}",
+                    "s3_url": f"https://chubby-synthetic.s3.amazonaws.com/{key}",
+                }
+
+        def user_rows():
+            for i in range(users):
+                user_id = first_user + i
+                yield {
+                    "id": user_id,
+                    "email": f"user{user_id}.{seed}@example.com",
+                    "first_name": f"First{user_id}",
+                    "last_name": f"Last{user_id}",
+                }
+
+        def review_rows():
+            rng = random.Random(f"{seed}-reviews")
+            for i in range(reviews):
+                yield {
+                    "id": first_review + i,
+                    "hotel_id": first_hotel + rng.randrange(hotels),
+                    "user_id": first_user + rng.randrange(users),
+                    "setting_review": _text(rng, 8) if rng.random() < 0.5 else None,
+                    "room_review": _text(rng, 8) if rng.random() < 0.5 else None,
+                    "service_review": _text(rng, 8) if rng.random() < 0.5 else None,
+                    "food_review": _text(rng, 8) if rng.random() < 0.5 else None,
+                    "overall_review": _text(rng, 15),
+                }
+
+        review_images = int(reviews * review_image_ratio)
+
+        def review_image_rows():
+            rng = random.Random(f"{seed}-review-images")
+            for i in range(review_images):
+                review_id = first_review + rng.randrange(reviews)
+                yield {
+                    "id": first_review_image + i,
+                    "review_id": review_id,
+                    "image_url": f"uploads/reviews/synthetic_{review_id}_{i}.jpg",
+                    "image_type": rng.choice(image_types),
+                }
+
+        _insert_batches(conn, hotel_t, hotel_rows(), batch_size, "hotels", hotels)
+        _insert_batches(conn, hotel_image_t, hotel_image_rows(), batch_size, "hotel_images", hotels * images_per_hotel)
+        _insert_batches(conn, user_t, user_rows(), batch_size, "users", users)
+        _insert_batches(conn, review_t, review_rows(), batch_size, "reviews", reviews)
+        _insert_batches(conn, review_image_t, review_image_rows(), batch_size, "review_images", review_images)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Target DB (default: CHUBBY_DATABASE_URL)")
+    parser.add_argument("--hotels", type=int, default=1000)
+    parser.add_argument("--images-per-hotel", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--review-image-ratio", type=float, default=0.2, help="Review images per review")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ["CHUBBY_DATABASE_URL"] = args.database_url
+    if not os.getenv("CHUBBY_DATABASE_URL"):
+        sys.exit("Refusing to write synthetic data to the default chubby.db; pass --database-url.")
+    if args.hotels < 1 or args.users < 1:
+        sys.exit("--hotels and --users must be at least 1")
+
+    generate(
+        hotels=args.hotels,
+        images_per_hotel=args.images_per_hotel,
+        users=args.users,
+        reviews=args.reviews,
+        review_image_ratio=args.review_image_ratio,
+        seed=args.seed,
+        batch_size=args.batch_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
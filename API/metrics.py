@@ -0,0 +1,456 @@
+"""
+Request-level performance instrumentation.
+
+``MetricsMiddleware`` records, per route template: latency, SQL statement count and time
+(via engine events), response serialization time and request body (upload) bytes.
+Everything is exposed at ``GET /metrics`` in the Prometheus text format.
+
+Environment:
+
+- ``CHUBBY_SERVER_TIMING=1``: also send a ``Server-Timing`` header on every response.
+- ``CHUBBY_PROFILE_TOKEN``: enables the sampling profiler endpoints under ``/debug/profile``
+  (send the token as ``X-Profile-Token``). Only one route is profiled at a time.
+- ``CHUBBY_PROFILE_ROUTE``: route template to profile from boot (e.g. ``/hotels``).
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import fastapi.routing
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**kw: str) -> Labels:
+    return tuple(sorted(kw.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+# ---------- Metric types ----------
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Gauge:
+    """
+    Gauge read at scrape time from ``fn``, which returns ``{labels: value}`` or a number.
+    If ``fn`` raises (e.g. the jobs DB is unavailable) the gauge is rendered without samples,
+    so one broken source never takes down the rest of ``/metrics``.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], object]):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.fn()
+        except Exception:
+            logger.exception("Could not read gauge %s", self.name)
+            return "\n".join(lines)
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> ([per-bucket counts..., +Inf count], sum)
+        self._values: Dict[Labels, Tuple[list, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {counts[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return "\n".join(lines)
+
+
+REGISTRY: list = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+REQUEST_DURATION = register(Histogram(
+    "chubby_http_request_duration_seconds", "Request latency by method, route template and status."))
+SQL_STATEMENTS = register(Counter(
+    "chubby_sql_statements_total", "SQL statements executed, by method and route template."))
+SQL_DURATION = register(Histogram(
+    "chubby_sql_duration_seconds", "Total SQL time per request, by method and route template."))
+SERIALIZE_DURATION = register(Histogram(
+    "chubby_serialization_duration_seconds",
+    "Response model validation and serialization time per request, by method and route template."))
+UPLOAD_BYTES = register(Counter(
+    "chubby_upload_bytes_total", "Request body bytes read, by method and route template."))
+
+
+# ---------- Per-request stats ----------
+
+@dataclass
+class RequestStats:
+    start: float = field(default_factory=time.perf_counter)
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+    upload_bytes: int = 0
+    profiled: bool = False
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("chubby_request_stats", default=None)
+
+
+# The start time lives on the per-statement execution context, so a statement that raises
+# (and never reaches ``after_cursor_execute``) leaves nothing behind on the pooled connection.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._chubby_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_chubby_query_start", None)
+    stats = _current.get()
+    if stats is not None and started is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _timed_serialize_response(serialize):
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await serialize(*args, **kwargs)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.serialize_seconds += time.perf_counter() - started
+
+    wrapper.__wrapped__ = serialize
+    return wrapper
+
+
+def _tracked_run_in_threadpool(run_in_threadpool):
+    async def wrapper(func, *args, **kwargs):
+        def tracked(*a, **kw):
+            with PROFILER.track():
+                return func(*a, **kw)
+
+        return await run_in_threadpool(tracked, *args, **kwargs)
+
+    wrapper.__wrapped__ = run_in_threadpool
+    return wrapper
+
+
+def instrument_threadpool() -> None:
+    # Sync endpoints run via ``fastapi.routing.run_in_threadpool``; wrapping it lets the
+    # profiler tell which threadpool thread is serving a profiled request.
+    if not hasattr(fastapi.routing.run_in_threadpool, "__wrapped__"):
+        fastapi.routing.run_in_threadpool = _tracked_run_in_threadpool(fastapi.routing.run_in_threadpool)
+
+
+def instrument_serialization() -> None:
+    # FastAPI looks ``serialize_response`` up as a module global on every request,
+    # so wrapping it here times response_model validation for all routes.
+    if not hasattr(fastapi.routing.serialize_response, "__wrapped__"):
+        fastapi.routing.serialize_response = _timed_serialize_response(fastapi.routing.serialize_response)
+
+
+# ---------- Middleware ----------
+
+SERVER_TIMING = os.getenv("CHUBBY_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so upload bytes are counted as the body streams in."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                stats.upload_bytes += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(stats).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        stats.profiled = PROFILER.begin(scope)
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            if stats.profiled:
+                PROFILER.end()
+            _current.reset(token)
+            method = scope["method"]
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - stats.start,
+                method=method, route=route, status=str(status["code"]),
+            )
+            SQL_STATEMENTS.inc(stats.sql_count, method=method, route=route)
+            SQL_DURATION.observe(stats.sql_seconds, method=method, route=route)
+            SERIALIZE_DURATION.observe(stats.serialize_seconds, method=method, route=route)
+            if stats.upload_bytes:
+                UPLOAD_BYTES.inc(stats.upload_bytes, method=method, route=route)
+
+
+def _server_timing(stats: RequestStats) -> str:
+    app_ms = (time.perf_counter() - stats.start) * 1000
+    return ", ".join([
+        f'sql;dur={stats.sql_seconds * 1000:.2f};desc="{stats.sql_count} queries"',
+        f"serialize;dur={stats.serialize_seconds * 1000:.2f}",
+        f"app;dur={app_ms:.2f}",
+    ])
+
+
+# ---------- Sampling profiler ----------
+
+APP_DIR = str(Path(__file__).resolve().parent)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads serving requests for ``route`` every ``interval`` seconds.
+    Only threadpool threads tagged via ``track()`` and the event-loop thread are sampled, and
+    the loop thread only while the task running on it is a profiled request's task, so job
+    workers and other concurrent requests are never included. Stacks that do not pass through
+    this app's source files are dropped. Output is the folded format used by flamegraph.pl /
+    speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.route: Optional[str] = os.getenv("CHUBBY_PROFILE_ROUTE") or None
+        self.stacks: _StackCounter = _StackCounter()
+        # thread ident -> number of in-flight profiled requests it is serving
+        self._threads: _StackCounter = _StackCounter()
+        # event-loop thread ident -> its loop, and the asyncio tasks of in-flight profiled requests
+        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    def enable(self, route: Optional[str]) -> None:
+        with self._lock:
+            self.route = route or None
+            self.stacks.clear()
+
+    def begin(self, scope) -> bool:
+        """Called on the event-loop thread when a request starts; returns whether it is profiled."""
+        if self.route is None or not _matches(scope, self.route):
+            return False
+        ident = threading.get_ident()
+        with self._lock:
+            self._loops[ident] = asyncio.get_running_loop()
+            self._tasks.add(asyncio.current_task())
+        self._add(ident)
+        return True
+
+    def end(self) -> None:
+        with self._lock:
+            self._tasks.discard(asyncio.current_task())
+        self._remove(threading.get_ident())
+
+    @contextmanager
+    def track(self):
+        """Sample the current thread while it works for the current (profiled) request."""
+        stats = _current.get()
+        if stats is None or not stats.profiled:
+            yield
+            return
+        ident = threading.get_ident()
+        self._add(ident)
+        try:
+            yield
+        finally:
+            self._remove(ident)
+
+    def _add(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chubby-profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def _remove(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+                self._loops.pop(ident, None)
+
+    def folded(self) -> str:
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._threads:
+                    self._wake.wait()
+                idents = set(self._threads)
+                loops = dict(self._loops)
+                tasks = set(self._tasks)
+            frames = sys._current_frames()
+            for ident in idents:
+                # On the loop thread, skip samples taken while another request's task runs.
+                if ident in loops and asyncio.current_task(loops[ident]) not in tasks:
+                    continue
+                frame = frames.get(ident)
+                stack = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or code.co_filename.startswith(APP_DIR)
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if in_app:
+                    with self._lock:
+                        self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+def _matches(scope, route: str) -> bool:
+    # The router has not run yet when the middleware starts, so match the concrete
+    # path against the template by segment ("{hotel_id}" matches any segment).
+    want = route.strip("/").split("/")
+    got = scope["path"].strip("/").split("/")
+    return len(want) == len(got) and all(
+        w == g or (w.startswith("{") and w.endswith("}")) for w, g in zip(want, got)
+    )
+
+
+PROFILER = SamplingProfiler()
+
+
+# ---------- Routes ----------
+
+router = APIRouter(include_in_schema=False)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def _check_profile_token(token: Optional[str]) -> None:
+    expected = os.getenv("CHUBBY_PROFILE_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token != expected:
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+@router.put("/debug/profile")
+def set_profile_route(
+    route: Optional[str] = Query(None, description="Route template to profile, e.g. /hotels; omit to stop"),
+    x_profile_token: Optional[str] = Header(None),
+):
+    """Switch the sampling profiler to a single route (clears previous samples)."""
+    _check_profile_token(x_profile_token)
+    PROFILER.enable(route)
+    return {"route": PROFILER.route}
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse)
+def get_profile(x_profile_token: Optional[str] = Header(None)):
+    """Collapsed stacks for the profiled route."""
+    _check_profile_token(x_profile_token)
+    return PlainTextResponse(PROFILER.folded())
@@ -0,0 +1,10 @@
+"""
+One-time schema setup, run per deploy before starting workers:
+
+    python migrate.py
+"""
+from models import init_db
+
+if __name__ == "__main__":
+    init_db()
+    print("Database schema is up to date.")
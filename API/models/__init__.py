@@ -1,4 +1,4 @@
-from .database import Base, engine, SessionLocal
+from .database import Base, engine, SessionLocal, init_db
 from .enums import HotelClassEnum, ReviewImageTypeEnum
 from .hotel_models import HotelDB, HotelImageDB
 from .user_models import UserDB, ReviewDB, ReviewImageDB
@@ -9,6 +9,7 @@ __all__ = [
     "Base",
     "engine", 
     "SessionLocal",
+    "init_db",
     "HotelClassEnum",
     "ReviewImageTypeEnum",
     "HotelDB",
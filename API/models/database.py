@@ -1,9 +1,19 @@
+import os
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# Database configuration
-DATABASE_URL = "sqlite:///./chubby.db"
+# Database configuration (override with CHUBBY_DATABASE_URL, e.g. to point at a synthetic benchmark DB)
+DATABASE_URL = os.getenv("CHUBBY_DATABASE_URL", "sqlite:///./chubby.db")
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-Base = declarative_base() 
\ No newline at end of file
+Base = declarative_base()
+
+
+def init_db() -> None:
+    """Create any missing tables. Run once per deploy (``python migrate.py``), not per worker."""
+    # Table classes register themselves on ``Base`` when the models package is imported.
+    import models  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
@@ -0,0 +1,239 @@
+"""
+Mirror hotel images to S3 (or any S3-compatible store) and fill ``HotelImageDB.s3_url``.
+
+Images are streamed from their source (a file under ``uploads/`` or a third-party URL)
+straight into a multipart upload, so nothing is buffered whole in memory. Keys follow
+the existing layout, ``hotels/<hotel_id>/<image_id>.<ext>``.
+
+New uploads are mirrored by the ``hotel_image.uploaded`` job; existing and scraped
+images are backfilled with::
+
+    python s3mirror.py --concurrency 8 --rate 20
+
+Both paths skip rows that already have ``s3_url`` and reuse an object that is already
+in the bucket, so a run can be stopped and restarted at any point.
+
+Environment:
+
+- ``CHUBBY_S3_BUCKET``: target bucket; mirroring is off when unset.
+- ``CHUBBY_S3_REGION`` (default ``us-east-2``) and ``CHUBBY_S3_ENDPOINT_URL`` (for MinIO,
+  moto or another S3-compatible store).
+- ``CHUBBY_S3_PUBLIC_URL``: base URL written to ``s3_url`` (e.g. a CDN); defaults to the
+  bucket's virtual-hosted URL, or ``<endpoint>/<bucket>`` with a custom endpoint.
+- ``CHUBBY_S3_RATE``: max images started per second, per process (default unlimited).
+- ``CHUBBY_S3_MAX_BANDWIDTH``: max upload bytes per second, per process (default unlimited).
+"""
+import argparse
+import logging
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+S3_BUCKET = os.getenv("CHUBBY_S3_BUCKET")
+S3_REGION = os.getenv("CHUBBY_S3_REGION", "us-east-2")
+S3_ENDPOINT_URL = os.getenv("CHUBBY_S3_ENDPOINT_URL")
+S3_PUBLIC_URL = os.getenv("CHUBBY_S3_PUBLIC_URL")
+S3_RATE = float(os.getenv("CHUBBY_S3_RATE", "0"))
+S3_MAX_BANDWIDTH = int(os.getenv("CHUBBY_S3_MAX_BANDWIDTH", "0"))
+
+MULTIPART_CHUNK = 8 * 1024 * 1024
+
+
+def enabled() -> bool:
+    return bool(S3_BUCKET)
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per second (no limit when ``rate`` <= 0)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(1.0, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            wait = (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+
+class S3Mirror:
+    def __init__(
+        self,
+        bucket: str,
+        region: str = S3_REGION,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        public_url: Optional[str] = S3_PUBLIC_URL,
+        rate: float = S3_RATE,
+        max_bandwidth: int = S3_MAX_BANDWIDTH,
+        part_concurrency: int = 4,
+    ):
+        # Imported here so the API does not need boto3 unless mirroring is configured.
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.client = boto3.client("s3", region_name=region, endpoint_url=endpoint_url)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_CHUNK,
+            multipart_chunksize=MULTIPART_CHUNK,
+            max_concurrency=part_concurrency,
+            max_bandwidth=max_bandwidth or None,
+        )
+        if public_url:
+            self.public_url = public_url.rstrip("/")
+        elif endpoint_url:
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_url = f"https://{bucket}.s3.{region}.amazonaws.com"
+        self.limiter = RateLimiter(rate)
+
+    def _exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def mirror(self, image_id: int) -> Optional[str]:
+        """Upload one ``HotelImageDB`` row's image and store its ``s3_url``; returns the URL."""
+        from models import SessionLocal, HotelImageDB
+
+        with SessionLocal() as session:
+            image = session.get(HotelImageDB, image_id)
+            if image is None:
+                return None
+            if (image.s3_url or "").strip():
+                return image.s3_url
+            source = image.image_url
+            hotel_id = image.hotel_id
+
+        self.limiter.acquire()
+        if source.startswith(("http://", "https://")):
+            key = self._upload_url(source, hotel_id, image_id)
+        else:
+            key = self._upload_file(source, hotel_id, image_id)
+
+        s3_url = f"{self.public_url}/{key}"
+        with SessionLocal() as session:
+            image = session.get(HotelImageDB, image_id)
+            if image is not None:
+                image.s3_url = s3_url
+                session.commit()
+        return s3_url
+
+    def _upload_file(self, path: str, hotel_id: int, image_id: int) -> str:
+        key = _key(hotel_id, image_id, os.path.splitext(path)[1], mimetypes.guess_type(path)[0])
+        if not self._exists(key):
+            with open(path, "rb") as f:
+                self.client.upload_fileobj(
+                    f, self.bucket, key,
+                    ExtraArgs={"ContentType": mimetypes.guess_type(path)[0] or "image/jpeg"},
+                    Config=self.transfer_config,
+                )
+        return key
+
+    def _upload_url(self, url: str, hotel_id: int, image_id: int) -> str:
+        import requests
+
+        with requests.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            content_type = (response.headers.get("Content-Type") or "image/jpeg").split(";")[0].strip()
+            key = _key(hotel_id, image_id, os.path.splitext(urlsplit(url).path)[1], content_type)
+            if not self._exists(key):
+                response.raw.decode_content = True
+                self.client.upload_fileobj(
+                    response.raw, self.bucket, key,
+                    ExtraArgs={"ContentType": content_type},
+                    Config=self.transfer_config,
+                )
+        return key
+
+
+def _key(hotel_id: int, image_id: int, ext: str, content_type: Optional[str]) -> str:
+    ext = ext.lower()
+    if ext not in (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif"):
+        ext = mimetypes.guess_extension(content_type or "") or ".jpg"
+    if ext == ".jpeg":
+        ext = ".jpg"
+    return f"hotels/{hotel_id}/{image_id}{ext}"
+
+
+_mirror: Optional[S3Mirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> S3Mirror:
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = S3Mirror(S3_BUCKET)
+        return _mirror
+
+
+def backfill(mirror: S3Mirror, concurrency: int, batch_size: int = 500, limit: Optional[int] = None) -> int:
+    """Mirror every image without ``s3_url``, in id order; returns how many were mirrored."""
+    from models import SessionLocal, HotelImageDB
+
+    done = 0
+    failed = 0
+    last_id = 0
+
+    def run(image_id: int) -> bool:
+        try:
+            mirror.mirror(image_id)
+            return True
+        except Exception as e:
+            logger.warning("Mirroring hotel image %s failed: %s", image_id, e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while limit is None or done + failed < limit:
+            with SessionLocal() as session:
+                ids = [
+                    row[0] for row in session.query(HotelImageDB.id)
+                    .filter(HotelImageDB.id > last_id)
+                    .filter((HotelImageDB.s3_url.is_(None)) | (HotelImageDB.s3_url == ""))
+                    .order_by(HotelImageDB.id)
+                    .limit(batch_size if limit is None else min(batch_size, limit - done - failed))
+                    .all()
+                ]
+            if not ids:
+                break
+            last_id = ids[-1]
+            for ok in pool.map(run, ids):
+                done += ok
+                failed += not ok
+            logger.info("Mirrored %s images (%s failed), up to id %s", done, failed, last_id)
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill HotelImageDB.s3_url by mirroring images to S3.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Images uploaded in parallel")
+    parser.add_argument("--rate", type=float, default=S3_RATE, help="Max images started per second")
+    parser.add_argument("--limit", type=int, help="Stop after this many images")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not enabled():
+        raise SystemExit("Set CHUBBY_S3_BUCKET to mirror images.")
+    backfill(S3Mirror(S3_BUCKET, rate=args.rate), args.concurrency, limit=args.limit)